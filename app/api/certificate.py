@@ -3,15 +3,24 @@ api/certificate.py
 FastAPI router for all certificate-related endpoints.
 """
 import asyncio
+import multiprocessing
+import tempfile
+import time
 import zipfile
-import io
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.responses import FileResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from app.core.config import settings
 from app.models.certificate_model import CertificateStatus
@@ -24,15 +33,93 @@ from app.utils.helpers import (
     safe_delete,
     utcnow,
 )
+from app.utils.rate_limiter import TokenBucket
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api/certificates", tags=["Certificates"])
 
+# PDF rendering is CPU-bound, so it runs in worker processes shared by all
+# batches. Started and shut down by the app lifespan; recreated if it breaks.
+_pdf_pool: ProcessPoolExecutor | None = None
 
-def get_db() -> AsyncIOMotorDatabase:
-    """Lazy import to avoid circular dependency."""
-    from app.main import db
-    return db
+# Status updates are coalesced into bulk_write calls of this size, or flushed
+# after BULK_FLUSH_SECONDS, whichever comes first
+BULK_WRITE_SIZE = 50
+BULK_FLUSH_SECONDS = 2.0
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MB
+
+# Initial batch records are inserted in chunks to stay well under BSON limits
+INSERT_CHUNK_SIZE = 5000
+
+# Live per-batch counts served by /progress, so polling never touches Mongo.
+# Batches missing here (e.g. after a restart) are counted from Mongo instead.
+_batch_counters: dict[str, dict[str, int]] = {}
+_counters_lock = asyncio.Lock()
+
+# One limiter per process, shared by every batch's email consumers, so the
+# configured rate caps the aggregate send rate regardless of concurrency
+_email_limiter = TokenBucket(rate=settings.EMAIL_RATE_PER_SECOND, capacity=settings.EMAIL_BURST)
+
+
+class _ZipChunkWriter:
+    """Write-only file object for zipfile that buffers output until drained."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def start_pdf_pool() -> ProcessPoolExecutor:
+    """Return the PDF worker pool, creating it if needed."""
+    global _pdf_pool
+    if _pdf_pool is None:
+        # "spawn" avoids forking the event loop and Motor's background threads
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    """Shut down the PDF worker pool, cancelling queued renders."""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+async def _render_pdf(name: str, cert_id: str, pdf_path: Path) -> bytes:
+    """Render a certificate in the worker pool and return the PDF bytes."""
+    loop = asyncio.get_running_loop()
+    render = partial(generate_certificate_pdf, name, cert_id, pdf_path, return_bytes=True)
+    pool = start_pdf_pool()
+    try:
+        _, pdf_bytes = await loop.run_in_executor(pool, render)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed): replace the pool and retry once
+        logger.warning("PDF worker pool is broken; recreating it.")
+        if _pdf_pool is pool:
+            shutdown_pdf_pool()
+        _, pdf_bytes = await loop.run_in_executor(start_pdf_pool(), render)
+    return pdf_bytes
+
+
+def get_db(request: Request) -> AsyncIOMotorDatabase:
+    """FastAPI dependency: the database created in the app lifespan."""
+    return request.app.state.db
 
 
 # ── Upload template ────────────────────────────────────────────────────────────
@@ -43,10 +130,23 @@ async def upload_template(file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".png"):
         raise HTTPException(status_code=400, detail="Template must be a PNG file.")
 
-    content = await file.read()
     dest = settings.TEMPLATE_PATH
     dest.parent.mkdir(parents=True, exist_ok=True)
-    dest.write_bytes(content)
+
+    # Stream in 1 MB chunks to a temp file unique to this upload, then swap it
+    # in, so concurrent uploads and in-progress renders never see a partial file
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            dir=dest.parent, prefix=dest.name, suffix=".part", delete=False
+        ) as out:
+            tmp = Path(out.name)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+        tmp.replace(dest)
+    finally:
+        if tmp is not None:
+            safe_delete(tmp)
     logger.info(f"Template uploaded: {dest}")
     return {"message": "Template uploaded successfully.", "path": str(dest)}
 
@@ -58,6 +158,7 @@ async def send_batch(
     csv_file: UploadFile = File(...),
     email_subject: str = Form(...),
     email_body: str = Form(...),
+    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
     Upload CSV and start batch certificate generation + email sending.
@@ -75,7 +176,6 @@ async def send_batch(
     if not rows:
         raise HTTPException(status_code=400, detail="CSV contains no valid rows.")
 
-    db = get_db()
     batch_id = generate_certificate_id()
 
     # Insert all records as PENDING
@@ -92,15 +192,43 @@ async def send_batch(
         }
         for name, email in rows
     ]
-    await db.certificates.insert_many(docs)
-    logger.info(f"Batch {batch_id}: {len(docs)} records inserted.")
+    # Unordered: each doc has its own UUID, so one failure shouldn't stop the rest
+    inserted = 0
+    for i in range(0, len(docs), INSERT_CHUNK_SIZE):
+        chunk = docs[i:i + INSERT_CHUNK_SIZE]
+        try:
+            result = await db.certificates.insert_many(chunk, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            write_errors = e.details.get("writeErrors", [])
+            first_error = write_errors[0].get("errmsg") if write_errors else str(e)
+            logger.error(
+                f"Batch {batch_id}: {len(write_errors)} of {len(chunk)} records "
+                f"in chunk failed to insert (first error: {first_error})"
+            )
+    logger.info(f"Batch {batch_id}: {inserted}/{len(docs)} records inserted.")
+
+    if inserted == 0:
+        raise HTTPException(status_code=500, detail="Failed to store batch records.")
+
+    async with _counters_lock:
+        _batch_counters[batch_id] = {"total": inserted, "sent": 0, "failed": 0}
 
     # Launch background task
     asyncio.create_task(
         _process_batch(batch_id, email_subject, email_body, db)
     )
 
-    return {"batch_id": batch_id, "total": len(docs)}
+    return {"batch_id": batch_id, "total": inserted}
+
+
+async def _bump_counter(batch_id: str, field: str, delta: int = 1) -> None:
+    """Adjust a live batch counter, if this process is tracking the batch."""
+    async with _counters_lock:
+        counters = _batch_counters.get(batch_id)
+        if counters is not None:
+            counters[field] += delta
 
 
 async def _process_batch(
@@ -109,50 +237,162 @@ async def _process_batch(
     email_body: str,
     db: AsyncIOMotorDatabase,
 ):
-    """Background task: generate PDFs and send emails for a batch."""
-    cursor = db.certificates.find({"batch_id": batch_id, "status": CertificateStatus.PENDING})
-    async for doc in cursor:
-        cert_id = doc["certificate_id"]
-        name = doc["name"]
-        email = doc["email"]
-        pdf_path = settings.GENERATED_DIR / f"{cert_id}.pdf"
+    """
+    Background task: generate PDFs and send emails for a batch.
 
+    Runs as a two-stage pipeline: PDFs are rendered in the process pool and
+    queued, while EMAIL_CONCURRENCY consumers send them and update the DB.
+    """
+    concurrency = settings.EMAIL_CONCURRENCY
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    render_slots = asyncio.Semaphore(settings.PDF_WORKERS)
+    # (UpdateOne, "sent" | "failed") pairs waiting to be written
+    pending_updates: list[tuple[UpdateOne, str]] = []
+
+    async def flush():
+        if not pending_updates:
+            return
+        batch = pending_updates[:]
+        pending_updates.clear()
+        unwritten = batch
         try:
-            # Generate PDF
-            generate_certificate_pdf(name, cert_id, pdf_path)
+            await db.certificates.bulk_write([op for op, _ in batch], ordered=False)
+            unwritten = []
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            unwritten = [item for i, item in enumerate(batch) if i in failed]
+            logger.error(f"[{batch_id}] {len(unwritten)} of {len(batch)} status updates failed: {e}")
+        except Exception as e:
+            logger.error(f"[{batch_id}] Bulk status update failed: {e}")
+        finally:
+            # Unwritten statuses go back for the next flush (also if cancelled);
+            # progress only advances for the ones actually written
+            pending_updates[:0] = unwritten
+            unwritten_ids = {id(item) for item in unwritten}
+            written = {"sent": 0, "failed": 0}
+            for item in batch:
+                if id(item) not in unwritten_ids:
+                    written[item[1]] += 1
+            for field, n in written.items():
+                if n:
+                    await _bump_counter(batch_id, field, n)
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(BULK_FLUSH_SECONDS)
+            await flush()
+
+    async def render(doc: dict):
+        pdf_path = settings.GENERATED_DIR / f"{doc['certificate_id']}.pdf"
+        pdf_bytes, error = None, None
+        try:
+            pdf_bytes = await _render_pdf(doc["name"], doc["certificate_id"], pdf_path)
+        except Exception as e:
+            error = e
+        try:
+            await queue.put((doc, pdf_path, pdf_bytes, error))
+        finally:
+            render_slots.release()
+
+    async def produce():
+        tasks = []
+        try:
+            cursor = db.certificates.find({"batch_id": batch_id, "status": CertificateStatus.PENDING})
+            async for doc in cursor:
+                await render_slots.acquire()
+                tasks.append(asyncio.create_task(render(doc)))
+        finally:
+            # Let in-flight renders reach the queue before the sentinels, even
+            # if the cursor failed, so their PDFs are still sent and recorded
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # One sentinel per consumer
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def consume():
+        while (item := await queue.get()) is not None:
+            doc, pdf_path, pdf_bytes, error = item
+            cert_id = doc["certificate_id"]
+            name = doc["name"]
+            email = doc["email"]
 
-            # Send email
-            await send_certificate_email(name, email, email_subject, email_body, pdf_path)
+            try:
+                if error is not None:
+                    raise error
+
+                # Send email
+                await _email_limiter.acquire()
+                await send_certificate_email(name, email, email_subject, email_body, pdf_bytes)
+
+                # Queue DB update
+                pending_updates.append((UpdateOne(
+                    {"certificate_id": cert_id},
+                    {"$set": {
+                        "status": CertificateStatus.SENT,
+                        "file_path": str(pdf_path),
+                        "expires_at": utcnow() + timedelta(hours=settings.PDF_RETENTION_HOURS),
+                    }},
+                ), "sent"))
+                logger.info(f"[{batch_id}] Sent to {email}")
 
-            # Update DB
-            await db.certificates.update_one(
-                {"certificate_id": cert_id},
-                {"$set": {"status": CertificateStatus.SENT, "file_path": str(pdf_path)}},
-            )
-            logger.info(f"[{batch_id}] Sent to {email}")
+            except Exception as e:
+                logger.error(f"[{batch_id}] Failed for {email}: {e}")
+                safe_delete(pdf_path)
+                pending_updates.append((UpdateOne(
+                    {"certificate_id": cert_id},
+                    {"$set": {"status": CertificateStatus.FAILED, "error_message": str(e)}},
+                ), "failed"))
 
-        except Exception as e:
-            logger.error(f"[{batch_id}] Failed for {email}: {e}")
-            await db.certificates.update_one(
-                {"certificate_id": cert_id},
-                {"$set": {"status": CertificateStatus.FAILED, "error_message": str(e)}},
-            )
-        finally:
-            # Delay between sends (batch-safe)
-            await asyncio.sleep(settings.EMAIL_DELAY_SECONDS)
-            # Clean up PDF after send (comment out to keep files)
-            safe_delete(pdf_path)
+            if len(pending_updates) >= BULK_WRITE_SIZE:
+                await flush()
+
+    flusher = asyncio.create_task(flush_periodically())
+    try:
+        # Wait for every stage to finish before the final flush below, even if
+        # one of them failed
+        results = await asyncio.gather(
+            produce(), *(consume() for _ in range(concurrency)), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"[{batch_id}] Batch pipeline error: {result}")
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        await flush()
+        if pending_updates:
+            logger.error(f"[{batch_id}] {len(pending_updates)} status updates could not be written.")
+        # Finished batches are served by the Mongo fallback in /progress
+        async with _counters_lock:
+            _batch_counters.pop(batch_id, None)
 
 
 # ── Progress endpoint ──────────────────────────────────────────────────────────
 
+async def _count_from_mongo(db: AsyncIOMotorDatabase, batch_id: str) -> tuple[int, int, int]:
+    """Return (total, sent, failed) for a batch with a single aggregation."""
+    cursor = db.certificates.aggregate([
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+    ])
+    counts = {group["_id"]: group["n"] async for group in cursor}
+    return (
+        sum(counts.values()),
+        counts.get(CertificateStatus.SENT, 0),
+        counts.get(CertificateStatus.FAILED, 0),
+    )
+
+
 @router.get("/progress/{batch_id}")
-async def get_progress(batch_id: str):
+async def get_progress(batch_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Return current batch progress counts."""
-    db = get_db()
-    total = await db.certificates.count_documents({"batch_id": batch_id})
-    sent = await db.certificates.count_documents({"batch_id": batch_id, "status": CertificateStatus.SENT})
-    failed = await db.certificates.count_documents({"batch_id": batch_id, "status": CertificateStatus.FAILED})
+    async with _counters_lock:
+        counters = dict(_batch_counters.get(batch_id) or {})
+
+    if counters:
+        total, sent, failed = counters["total"], counters["sent"], counters["failed"]
+    else:
+        total, sent, failed = await _count_from_mongo(db, batch_id)
     pending = total - sent - failed
 
     return {
@@ -168,15 +408,34 @@ async def get_progress(batch_id: str):
 # ── Status table endpoint ──────────────────────────────────────────────────────
 
 @router.get("/status/{batch_id}")
-async def get_status(batch_id: str, skip: int = 0, limit: int = 100):
-    """Paginated list of certificate statuses for a batch."""
-    db = get_db()
+async def get_status(
+    batch_id: str,
+    after_id: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Paginated list of certificate statuses for a batch.
+    Keyset pagination on _id: pass the returned next_cursor as after_id to get
+    the following page (next_cursor is None on the last page).
+    """
+    query = {"batch_id": batch_id}
+    if after_id:
+        try:
+            query["_id"] = {"$gt": ObjectId(after_id)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid after_id cursor.")
+
     cursor = db.certificates.find(
-        {"batch_id": batch_id},
-        {"_id": 0, "certificate_id": 1, "name": 1, "email": 1, "status": 1, "error_message": 1, "created_at": 1},
-    ).skip(skip).limit(limit)
+        query,
+        {"certificate_id": 1, "name": 1, "email": 1, "status": 1, "error_message": 1, "created_at": 1},
+    ).sort("_id", 1).limit(limit)
     records = await cursor.to_list(length=limit)
-    return {"records": records}
+
+    next_cursor = str(records[-1]["_id"]) if records and len(records) == limit else None
+    for record in records:
+        del record["_id"]
+    return {"records": records, "next_cursor": next_cursor}
 
 
 # ── Retry failed ───────────────────────────────────────────────────────────────
@@ -186,9 +445,9 @@ async def retry_failed(
     batch_id: str,
     email_subject: str = Form(...),
     email_body: str = Form(...),
+    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """Reset failed records to PENDING and re-launch batch processing."""
-    db = get_db()
     result = await db.certificates.update_many(
         {"batch_id": batch_id, "status": CertificateStatus.FAILED},
         {"$set": {"status": CertificateStatus.PENDING, "error_message": None}},
@@ -196,6 +455,7 @@ async def retry_failed(
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="No failed records found for this batch.")
 
+    await _bump_counter(batch_id, "failed", -result.modified_count)
     asyncio.create_task(_process_batch(batch_id, email_subject, email_body, db))
     return {"message": f"Retrying {result.modified_count} failed records."}
 
@@ -203,35 +463,85 @@ async def retry_failed(
 # ── Download ZIP of all generated certificates ─────────────────────────────────
 
 @router.get("/download-zip/{batch_id}")
-async def download_zip(batch_id: str):
+async def download_zip(batch_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """
-    Re-generate all certificates for a batch and return as a ZIP file.
-    Note: PDF files are deleted after emailing, so this re-generates them.
+    Stream the batch's certificates as a ZIP file.
+    Only SENT certificates are included: PDFs are kept on disk for
+    PDF_RETENTION_HOURS after sending, so this only reads stored files and
+    skips expired or missing ones. Pending and failed records are left out.
     """
-    db = get_db()
-    cursor = db.certificates.find({"batch_id": batch_id})
+    cursor = db.certificates.find({"batch_id": batch_id}, {"name": 1, "file_path": 1})
     records = await cursor.to_list(length=10000)
 
     if not records:
         raise HTTPException(status_code=404, detail="Batch not found.")
 
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for doc in records:
-            name = doc["name"]
-            cert_id = doc["certificate_id"]
-            pdf_path = settings.GENERATED_DIR / f"{cert_id}_dl.pdf"
-            try:
-                generate_certificate_pdf(name, cert_id, pdf_path)
-                zf.write(pdf_path, arcname=f"{name.replace(' ', '_')}_certificate.pdf")
-            except Exception as e:
-                logger.warning(f"Skipped {name} in ZIP: {e}")
-            finally:
-                safe_delete(pdf_path)
+    records = [doc for doc in records if doc.get("file_path")]
+    if not records:
+        raise HTTPException(status_code=410, detail="Certificates expired or not yet sent.")
+
+    async def zip_stream() -> AsyncGenerator[bytes, None]:
+        sink = _ZipChunkWriter()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for doc in records:
+                name = doc["name"]
+                try:
+                    pdf_bytes = await asyncio.to_thread(Path(doc["file_path"]).read_bytes)
+                except OSError as e:
+                    logger.warning(f"Skipped {name} in ZIP: {e}")
+                    continue
+                arcname = f"{name.replace(' ', '_')}_certificate.pdf"
+                await asyncio.to_thread(zf.writestr, arcname, pdf_bytes)
+                yield sink.drain()
+        # Central directory is written when the archive closes
+        yield sink.drain()
 
-    zip_buffer.seek(0)
     return StreamingResponse(
-        zip_buffer,
+        zip_stream(),
         media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename=certificates_{batch_id[:8]}.zip"},
+        headers={"Content-Disposition": f"attachment; filename=certificates_{batch_id[-8:]}.zip"},
     )
+
+
+# ── PDF retention ──────────────────────────────────────────────────────────────
+
+def _sweep_generated_dir(max_age_seconds: float) -> int:
+    """Delete PDFs in GENERATED_DIR older than max_age_seconds; return the count."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in settings.GENERATED_DIR.glob("*.pdf"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+async def purge_expired_pdfs(db: AsyncIOMotorDatabase) -> int:
+    """
+    Delete stored PDFs past their expires_at and clear their file_path, then
+    sweep GENERATED_DIR for files older than PDF_RETENTION_HOURS that no
+    record points at (e.g. a status write that never landed).
+    """
+    cursor = db.certificates.find(
+        {"expires_at": {"$lte": utcnow()}, "file_path": {"$ne": None}},
+        {"certificate_id": 1, "file_path": 1},
+    )
+    cert_ids = []
+    async for doc in cursor:
+        safe_delete(doc["file_path"])
+        cert_ids.append(doc["certificate_id"])
+
+    if cert_ids:
+        await db.certificates.update_many(
+            {"certificate_id": {"$in": cert_ids}},
+            {"$set": {"file_path": None, "expires_at": None}},
+        )
+
+    swept = await asyncio.to_thread(_sweep_generated_dir, settings.PDF_RETENTION_HOURS * 3600)
+    purged = len(cert_ids) + swept
+    if purged:
+        logger.info(f"Purged {len(cert_ids)} expired and {swept} orphaned certificate PDFs.")
+    return purged
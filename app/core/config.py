@@ -11,6 +11,15 @@ load_dotenv()
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (respects container/affinity limits)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
 class Settings:
     # App
     APP_HOST: str = os.getenv("APP_HOST", "0.0.0.0")
@@ -20,6 +29,11 @@ class Settings:
     # MongoDB
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     MONGO_DB_NAME: str = os.getenv("MONGO_DB_NAME", "smart_certificates")
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 5))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 30000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS", "zstd")  # wire compression
 
     # Gmail (kept for reference but no longer used for sending)
     GMAIL_ADDRESS: str = os.getenv("GMAIL_ADDRESS", "")
@@ -37,15 +51,20 @@ class Settings:
 
     # Certificate
     CERT_DPI: int = int(os.getenv("CERT_DPI", 300))
+    OUTPUT_DPI: int = int(os.getenv("OUTPUT_DPI", 200))  # embedded image resolution
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", _available_cpus()))  # each holds a decoded template
     CM_TO_PX: float = 118.0  # 1cm ≈ 118px at 300 DPI
     NAME_X_CM: float = float(os.getenv("NAME_X_CM", 8.62))
     NAME_Y_CM: float = float(os.getenv("NAME_Y_CM", 9.21))
     TEXT_BOX_WIDTH_CM: float = float(os.getenv("TEXT_BOX_WIDTH_CM", 18.81))
     DEFAULT_FONT_SIZE: int = int(os.getenv("DEFAULT_FONT_SIZE", 72))
     MIN_FONT_SIZE: int = int(os.getenv("MIN_FONT_SIZE", 36))
+    PDF_RETENTION_HOURS: int = int(os.getenv("PDF_RETENTION_HOURS", 72))  # keep sent PDFs for ZIP downloads
 
     # Email
-    EMAIL_DELAY_SECONDS: float = 1.0
+    EMAIL_RATE_PER_SECOND: float = float(os.getenv("EMAIL_RATE_PER_SECOND", 2.0))
+    EMAIL_BURST: int = int(os.getenv("EMAIL_BURST", 2))  # keep <= rate to avoid provider 429s
+    EMAIL_CONCURRENCY: int = int(os.getenv("EMAIL_CONCURRENCY", 5))
 
 settings = Settings()
 
@@ -2,6 +2,7 @@
 app/main.py
 FastAPI application factory and startup configuration.
 """
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -14,27 +15,51 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# ── MongoDB client (module-level, shared across requests) ──────────────────────
-client: motor.motor_asyncio.AsyncIOMotorClient | None = None
-db: motor.motor_asyncio.AsyncIOMotorDatabase | None = None
+# How often stored PDFs past their retention window are deleted
+PDF_PURGE_INTERVAL_SECONDS = 3600
+
+
+async def _purge_pdfs_periodically(database: motor.motor_asyncio.AsyncIOMotorDatabase):
+    """Background loop: delete certificate PDFs older than PDF_RETENTION_HOURS."""
+    while True:
+        try:
+            await purge_expired_pdfs(database)
+        except Exception as e:
+            logger.error(f"PDF purge failed: {e}")
+        await asyncio.sleep(PDF_PURGE_INTERVAL_SECONDS)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize and tear down resources on startup/shutdown."""
-    global client, db
     logger.info("Connecting to MongoDB...")
-    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_URI)
+    # One shared client per process; request handlers get the db via Depends(get_db)
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        settings.MONGO_URI,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        compressors=settings.MONGO_COMPRESSORS,
+    )
     db = client[settings.MONGO_DB_NAME]
+    app.state.db = db
 
     # Ensure indexes
-    await db.certificates.create_index("batch_id")
+    # batch_id queries use the prefix; /status pages through it in _id order
+    await db.certificates.create_index([("batch_id", 1), ("_id", 1)])
     await db.certificates.create_index("certificate_id", unique=True)
     await db.certificates.create_index("status")
+    await db.certificates.create_index("expires_at", sparse=True)
     logger.info(f"Connected to MongoDB: {settings.MONGO_DB_NAME}")
 
+    purge_task = asyncio.create_task(_purge_pdfs_periodically(db))
+    start_pdf_pool()
+
     yield  # App is running
 
+    purge_task.cancel()
+    shutdown_pdf_pool()
     logger.info("Shutting down: closing MongoDB connection.")
     client.close()
 
@@ -70,7 +95,12 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 
 # ── Include routers ────────────────────────────────────────────────────────────
-from app.api.certificate import router as certificate_router
+from app.api.certificate import (
+    purge_expired_pdfs,
+    router as certificate_router,
+    shutdown_pdf_pool,
+    start_pdf_pool,
+)
 app.include_router(certificate_router)
 
 
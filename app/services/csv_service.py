@@ -3,7 +3,7 @@ services/csv_service.py
 Parses uploaded CSV files and returns validated name/email rows.
 """
 import io
-import pandas as pd
+import polars as pl
 from typing import List, Tuple
 
 from app.utils.helpers import get_logger
@@ -19,22 +19,26 @@ def parse_csv(file_bytes: bytes) -> List[Tuple[str, str]]:
     Skips rows with missing or invalid data.
     """
     try:
-        df = pd.read_csv(io.BytesIO(file_bytes))
+        # Read every column as text; names/emails should never be type-inferred
+        df = pl.read_csv(io.BytesIO(file_bytes), infer_schema_length=0)
         # Normalize column names
-        df.columns = [col.strip().lower() for col in df.columns]
+        df = df.rename({col: col.strip().lower() for col in df.columns})
 
         if "name" not in df.columns or "email" not in df.columns:
             raise ValueError("CSV must contain 'Name' and 'Email' columns.")
 
-        df = df[["name", "email"]].dropna()
-        df["name"] = df["name"].astype(str).str.strip()
-        df["email"] = df["email"].astype(str).str.strip().str.lower()
+        df = df.select(
+            pl.col("name").str.strip_chars(),
+            pl.col("email").str.strip_chars().str.to_lowercase(),
+        ).drop_nulls()
 
         # Filter out clearly invalid rows
-        df = df[df["name"].str.len() > 0]
-        df = df[df["email"].str.contains("@")]
+        df = df.filter(
+            (pl.col("name").str.len_chars() > 0)
+            & pl.col("email").str.contains("@", literal=True)
+        )
 
-        records = list(df.itertuples(index=False, name=None))
+        records = df.rows()
         logger.info(f"Parsed {len(records)} valid rows from CSV.")
         return records
 
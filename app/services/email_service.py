@@ -2,36 +2,36 @@
 services/email_service.py
 Async email sending via Resend API (HTTP-based, works on Render free plan).
 """
+import asyncio
 import base64
 import resend
-from pathlib import Path
 
 from app.core.config import settings
 from app.utils.helpers import get_logger, replace_template_vars
 
 logger = get_logger(__name__)
 
+# The Resend client is synchronous, so sends run in the default thread pool;
+# this caps how many HTTP requests are in flight at once.
+MAX_CONCURRENT_SENDS = 10
+_send_slots = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+
 
 async def send_certificate_email(
     recipient_name: str,
     recipient_email: str,
     subject_template: str,
     body_template: str,
-    pdf_path: str | Path,
+    pdf_bytes: bytes,
 ) -> None:
     """
     Send a single certificate email via Resend API.
+    Takes the PDF bytes straight from the generator to avoid re-reading the file.
     """
     subject = replace_template_vars(subject_template, recipient_name)
     body    = replace_template_vars(body_template, recipient_name)
-    pdf_path = Path(pdf_path)
-
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
-    # Read and base64 encode the PDF
-    with open(pdf_path, "rb") as f:
-        pdf_data = base64.b64encode(f.read()).decode("utf-8")
+    pdf_data = base64.b64encode(pdf_bytes).decode("utf-8")
 
     filename = f"certificate_{recipient_name.replace(' ', '_')}.pdf"
 
@@ -50,5 +50,6 @@ async def send_certificate_email(
         ],
     }
 
-    resend.Emails.send(params)
+    async with _send_slots:
+        await asyncio.get_running_loop().run_in_executor(None, resend.Emails.send, params)
     logger.info(f"Email sent via Resend to {recipient_email}")
\ No newline at end of file
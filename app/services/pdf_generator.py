@@ -4,8 +4,11 @@ Generates a certificate PDF by compositing the name onto the background image.
 - QR code removed (template already has its own)
 - Certificate number printed in plain sans-serif font at bottom right
 """
+import base64
+import hashlib
 import io
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 from reportlab.pdfgen import canvas
@@ -20,20 +23,27 @@ logger = get_logger(__name__)
 # ── Certificate number config ──────────────────────────────────────────────────
 # Change ORG_PREFIX to match your organization name
 ORG_PREFIX = "TEDxSNPSU"
-CERT_NUMBER_RANDOM_CHARS = 5
+CERT_NUMBER_RANDOM_CHARS = 7  # base32 chars of a 32-bit blake2b digest
+
+# Decoded templates keyed on (path, mtime), so a re-uploaded template is
+# picked up automatically. Lives per process (each PDF worker has its own).
+_template_cache: dict[tuple[Path, float], Image.Image] = {}
 
 
 def _generate_cert_number(certificate_id: str) -> str:
     """
     Generate a short unique certificate number.
-    Format: TEDxSNPSU-2026-A3F7K
-    Derived from the certificate UUID so it's unique per person.
+    Format: TEDxSNPSU-2026-A3F7K2Q
+    A base32 hash of the full certificate UUID, so it's unique per person and
+    doesn't depend on which part of the UUID is random.
     """
     year = datetime.utcnow().year
-    short_id = certificate_id.replace("-", "").upper()[:CERT_NUMBER_RANDOM_CHARS]
+    digest = hashlib.blake2b(certificate_id.encode(), digest_size=4).digest()
+    short_id = base64.b32encode(digest).decode().rstrip("=")[:CERT_NUMBER_RANDOM_CHARS]
     return f"{ORG_PREFIX}-{year}-{short_id}"
 
 
+@lru_cache(maxsize=8)
 def _load_plain_font(size: int = 28) -> ImageFont.FreeTypeFont:
     """
     Load a plain readable sans-serif font for the certificate number.
@@ -56,12 +66,58 @@ def _load_plain_font(size: int = 28) -> ImageFont.FreeTypeFont:
     return ImageFont.load_default()
 
 
+def _load_template(template_path: Path) -> Image.Image:
+    """Return the decoded template, decoding the file only once. Do not mutate."""
+    key = (template_path, template_path.stat().st_mtime)
+    template = _template_cache.get(key)
+    if template is None:
+        with Image.open(template_path) as img:
+            template = img.convert("RGB")
+        # Drop stale decodes of the same file before caching the new one
+        for stale in [k for k in _template_cache if k[0] == template_path]:
+            del _template_cache[stale]
+        _template_cache[key] = template
+    return template
+
+
+def prepare_batch_context(template_path: str | Path | None = None) -> dict:
+    """
+    Build the state shared by every certificate rendered from one template:
+    the decoded background, its size, the certificate-number font and the
+    layout constants derived from settings.
+
+    Cheap to call repeatedly: the template decode and font load are cached
+    per process, which is how PDF pool workers reuse it across a batch.
+    """
+    template_path = Path(template_path or settings.TEMPLATE_PATH)
+    if not template_path.exists():
+        raise FileNotFoundError(f"Certificate template not found: {template_path}")
+
+    bg = _load_template(template_path)
+    return {
+        "bg": bg,
+        "size": bg.size,
+        "cert_font": _load_plain_font(size=28),  # plain font, NOT cursive
+        "name_origin": (
+            cm_to_px(settings.NAME_X_CM, settings.CM_TO_PX),
+            cm_to_px(settings.NAME_Y_CM, settings.CM_TO_PX),
+        ),
+        "name_box_width": cm_to_px(settings.TEXT_BOX_WIDTH_CM, settings.CM_TO_PX),
+        "cert_margins": (
+            cm_to_px(0.6, settings.CM_TO_PX),  # 0.6 cm from right edge
+            cm_to_px(0.4, settings.CM_TO_PX),  # 0.4 cm from bottom edge
+        ),
+    }
+
+
 def generate_certificate_pdf(
     name: str,
     certificate_id: str,
     output_path: str | Path,
     template_path: str | Path | None = None,
-) -> Path:
+    ctx: dict | None = None,
+    return_bytes: bool = False,
+) -> Path | tuple[Path, bytes]:
     """
     Generate a PDF certificate for the given name.
 
@@ -69,35 +125,35 @@ def generate_certificate_pdf(
       1. Open the certificate template PNG
       2. Draw the recipient name centered at the configured (X, Y) position
       3. Draw a unique certificate number at the bottom right in plain text
-      4. Save as a PDF using ReportLab
-    """
-    template_path = Path(template_path or settings.TEMPLATE_PATH)
-    output_path   = Path(output_path)
+      4. Downscale from CERT_DPI to OUTPUT_DPI, encode as JPEG in memory
+         and embed it in a PDF using ReportLab
 
-    if not template_path.exists():
-        raise FileNotFoundError(f"Certificate template not found: {template_path}")
+    Pass a ctx from prepare_batch_context() to reuse the template and fonts;
+    otherwise one is built for template_path. With return_bytes=True the
+    PDF bytes are returned alongside the path so callers need not re-read it.
+    """
+    output_path = Path(output_path)
+    if ctx is None:
+        ctx = prepare_batch_context(template_path)
 
-    # ── 1. Open background image ──────────────────────────────────────────────
-    bg = Image.open(template_path).convert("RGBA")
-    img_width_px, img_height_px = bg.size
+    # ── 1. Copy background image ──────────────────────────────────────────────
+    bg = ctx["bg"].copy()
+    img_width_px, img_height_px = ctx["size"]
     logger.info(f"Template size: {img_width_px}x{img_height_px} px")
 
-    # ── 2. Create transparent text layer ─────────────────────────────────────
-    # All text is drawn on this transparent layer, then composited on top.
-    # This ensures text is always fully visible regardless of background.
-    txt_layer = Image.new("RGBA", bg.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(txt_layer)
+    # ── 2. Draw directly on the RGB background ────────────────────────────────
+    # Only the small certificate-number pill needs alpha blending (step 6),
+    # so there is no full-size transparent layer to composite.
+    draw = ImageDraw.Draw(bg)
 
-    # ── 3. Compute name position from .env settings ───────────────────────────
-    origin_x_px  = cm_to_px(settings.NAME_X_CM, settings.CM_TO_PX)
-    origin_y_px  = cm_to_px(settings.NAME_Y_CM, settings.CM_TO_PX)
-    box_width_px = cm_to_px(settings.TEXT_BOX_WIDTH_CM, settings.CM_TO_PX)
+    # ── 3. Name position from .env settings ───────────────────────────────────
+    origin_x_px, origin_y_px = ctx["name_origin"]
+    box_width_px = ctx["name_box_width"]
 
-    font, font_size = get_auto_sized_font(name)
+    font, font_size, bbox = get_auto_sized_font(name)
     logger.info(f"Rendering '{name}' | font size: {font_size} | origin: ({origin_x_px}px, {origin_y_px}px)")
 
     # ── 4. Center name horizontally within the text box ───────────────────────
-    bbox        = font.getbbox(name)
     text_width  = bbox[2] - bbox[0]
     text_height = bbox[3] - bbox[1]
 
@@ -107,50 +163,69 @@ def generate_certificate_pdf(
     logger.info(f"Final name position: ({text_x}px, {text_y}px)")
 
     # ── 5. Draw name in solid black (AlexBrush font) ──────────────────────────
-    draw.text((text_x, text_y), name, font=font, fill=(0, 0, 0, 255))
+    draw.text((text_x, text_y), name, font=font, fill=(0, 0, 0))
 
     # ── 6. Draw certificate number at bottom right in plain sans-serif ────────
     cert_number = _generate_cert_number(certificate_id)
-    cert_font   = _load_plain_font(size=28)   # plain font, NOT cursive
+    cert_font   = ctx["cert_font"]
 
     cert_bbox = cert_font.getbbox(cert_number)
     cert_w    = cert_bbox[2] - cert_bbox[0]
     cert_h    = cert_bbox[3] - cert_bbox[1]
 
-    margin_right  = cm_to_px(0.6, settings.CM_TO_PX)  # 0.6 cm from right edge
-    margin_bottom = cm_to_px(0.4, settings.CM_TO_PX)  # 0.4 cm from bottom edge
+    margin_right, margin_bottom = ctx["cert_margins"]
 
     cert_x = img_width_px - cert_w - margin_right
     cert_y = img_height_px - cert_h - margin_bottom
 
-    # Subtle white pill background for readability on any template color
+    # Subtle white pill background for readability on any template color.
+    # Pill + number are drawn on a small RGBA patch covering both, which is
+    # then pasted using its own alpha as the mask.
     padding = 10
-    draw.rounded_rectangle(
-        [cert_x - padding, cert_y - padding,
-         cert_x + cert_w + padding, cert_y + cert_h + padding],
+    pill = (cert_x - padding, cert_y - padding,
+            cert_x + cert_w + padding, cert_y + cert_h + padding)
+    patch_x0 = min(pill[0], cert_x + cert_bbox[0])
+    patch_y0 = min(pill[1], cert_y + cert_bbox[1])
+    patch_x1 = max(pill[2], cert_x + cert_bbox[2])
+    patch_y1 = max(pill[3], cert_y + cert_bbox[3])
+
+    patch = Image.new("RGBA", (patch_x1 - patch_x0, patch_y1 - patch_y0), (255, 255, 255, 0))
+    patch_draw = ImageDraw.Draw(patch)
+    patch_draw.rounded_rectangle(
+        [pill[0] - patch_x0, pill[1] - patch_y0, pill[2] - patch_x0, pill[3] - patch_y0],
         radius=6,
         fill=(255, 255, 255, 180),  # semi-transparent white
     )
 
     # Draw certificate number in dark gray
-    draw.text((cert_x, cert_y), cert_number, font=cert_font, fill=(50, 50, 50, 255))
+    patch_draw.text(
+        (cert_x - patch_x0, cert_y - patch_y0), cert_number, font=cert_font, fill=(50, 50, 50, 255)
+    )
+    bg.paste(patch, (patch_x0, patch_y0), patch)
     logger.info(f"Certificate number '{cert_number}' placed at ({cert_x}px, {cert_y}px)")
 
-    # ── 7. Composite text layer onto background ───────────────────────────────
-    combined = Image.alpha_composite(bg, txt_layer)
-
-    # ── 8. Convert RGBA → RGB for PDF embedding ───────────────────────────────
-    rgb_img = combined.convert("RGB")
-
-    # ── 9. Write PDF via ReportLab ────────────────────────────────────────────
+    # ── 7. Downscale to the output resolution ─────────────────────────────────
+    # Page size in points is unchanged; only the embedded pixel count shrinks.
+    rgb_img = bg
+    if settings.OUTPUT_DPI < settings.CERT_DPI:
+        scale = settings.OUTPUT_DPI / settings.CERT_DPI
+        rgb_img = bg.resize(
+            (int(img_width_px * scale), int(img_height_px * scale)),
+            Image.LANCZOS,
+        )
+
+    # ── 8. Write PDF via ReportLab ────────────────────────────────────────────
     img_width_pt  = img_width_px  * 72 / settings.CERT_DPI
     img_height_pt = img_height_px * 72 / settings.CERT_DPI
 
+    # JPEG is embedded by ReportLab as-is (DCTDecode), which avoids the
+    # PNG zlib encode + decode round-trip on the full-size image
     buffer = io.BytesIO()
-    rgb_img.save(buffer, format="PNG", dpi=(settings.CERT_DPI, settings.CERT_DPI))
+    rgb_img.save(buffer, format="JPEG", quality=90, optimize=False)
     buffer.seek(0)
 
-    pdf_canvas = canvas.Canvas(str(output_path), pagesize=(img_width_pt, img_height_pt))
+    pdf_buffer = io.BytesIO()
+    pdf_canvas = canvas.Canvas(pdf_buffer, pagesize=(img_width_pt, img_height_pt))
     pdf_canvas.drawImage(
         ImageReader(buffer),
         0, 0,
@@ -159,5 +234,10 @@ def generate_certificate_pdf(
     )
     pdf_canvas.save()
 
+    pdf_bytes = pdf_buffer.getvalue()
+    output_path.write_bytes(pdf_bytes)
+
     logger.info(f"Certificate PDF saved: {output_path}")
+    if return_bytes:
+        return output_path, pdf_bytes
     return output_path
\ No newline at end of file
@@ -2,11 +2,12 @@
 utils/helpers.py
 Shared utility functions used across services.
 """
-import uuid
 import logging
 from datetime import datetime
 from pathlib import Path
 
+from uuid6 import uuid7
+
 # Configure module logger
 logging.basicConfig(
     level=logging.INFO,
@@ -19,8 +20,11 @@ def get_logger(name: str) -> logging.Logger:
 
 
 def generate_certificate_id() -> str:
-    """Generate a unique certificate ID."""
-    return str(uuid.uuid4())
+    """
+    Generate a unique certificate ID.
+    UUIDv7 is time-ordered, so inserts land at the end of the certificate_id index.
+    """
+    return str(uuid7())
 
 
 def cm_to_px(cm: float, px_per_cm: float = 118.0) -> int: